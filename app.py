@@ -1,16 +1,33 @@
+import io
+import threading
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import numpy as np
 import joblib
+from joblib import Parallel, delayed
 from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+# Charts are only rendered to PNG; simplify line paths to cut draw work
+plt.rcParams.update({
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,
+    'agg.path.chunksize': 10000
+})
+
 # Page config
 st.set_page_config(page_title="EV Forecast", layout="wide")
 
 # Load model
+@st.cache_resource
+def get_model():
+    return joblib.load("forecasting_ev_model.pkl")
+
 try:
-    model = joblib.load("forecasting_ev_model.pkl")
+    model = get_model()
 except Exception as e:
     st.error(f"Error loading model: {e}")
     st.stop()
@@ -46,91 +63,175 @@ st.markdown("""
 
 @st.cache_data
 def load_data():
-    df = pd.read_csv("preprocessed_ev_data.csv")
-    df['Date'] = pd.to_datetime(df['Date'])
-    return df
+    # Date is stored as datetime64 in the Parquet file, no parsing needed
+    return pd.read_parquet("preprocessed_ev_data.parquet")
+
+# Shared read-only; cache_resource avoids copying every frame on each call
+@st.cache_resource
+def county_frames():
+    df = load_data()
+    return {c: g.sort_values("Date").reset_index(drop=True) for c, g in df.groupby("County", sort=False)}
+
+@st.cache_data
+def get_county_list():
+    df = load_data()
+    return sorted(df['County'].dropna().unique().tolist())
 
-df = load_data()
+forecast_horizon = 36
+# The model needs three real lags; shorter histories can't be forecast
+min_history = 3
+# Fill features in the model's training column order
+feature_names = model.feature_names_in_
+col_idx = {name: i for i, name in enumerate(feature_names)}
+# Least-squares slope over x = 0..5 is sum((x - 2.5) * y) / 17.5
+slope_weights = (np.arange(6) - 2.5) / 17.5
+
+@st.cache_data(show_spinner=False)
+def forecast_county(county):
+    model = get_model()
+    county_df = county_frames()[county]
+    county_code = county_df['county_encoded'].iloc[0]
+
+    # Forecasting
+    # Fixed-size windows of the last 6 months, right-aligned; filled counts
+    # how many slots hold real values for counties with 3-5 months of data
+    recent_ev = county_df['Electric Vehicle (EV) Total'].values[-6:]
+    filled = len(recent_ev)
+    historical_ev = np.zeros(6, dtype=np.float64)
+    historical_ev[6 - filled:] = recent_ev
+    cumulative_ev = np.cumsum(historical_ev)
+    months_since_start = county_df['months_since_start'].max()
+    latest_date = county_df['Date'].max()
+    # Dataset dates are month ends, so continue the series on month ends
+    future_dates = pd.date_range(latest_date, periods=forecast_horizon + 1, freq=pd.offsets.MonthEnd())[1:]
+    future_rows = []
+
+    # Feature row reused across steps; feat_df is a view over feat. Trees
+    # predict on float32, so sklearn doesn't need to convert it
+    feat = np.empty((1, len(feature_names)), dtype=np.float32)
+    feat_df = pd.DataFrame(feat, columns=feature_names, copy=False)
+    feat[0, col_idx['county_encoded']] = county_code
+
+    for i in range(1, forecast_horizon + 1):
+        forecast_date = future_dates[i - 1]
+        months_since_start += 1
+        lag1, lag2, lag3 = historical_ev[-1], historical_ev[-2], historical_ev[-3]
+        roll_mean = (lag1 + lag2 + lag3) / 3.0
+        pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
+        pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
+        ev_growth_slope = float(slope_weights @ cumulative_ev) if filled == 6 else 0
+
+        feat[0, col_idx['months_since_start']] = months_since_start
+        feat[0, col_idx['ev_total_lag1']] = lag1
+        feat[0, col_idx['ev_total_lag2']] = lag2
+        feat[0, col_idx['ev_total_lag3']] = lag3
+        feat[0, col_idx['ev_total_roll_mean_3']] = roll_mean
+        feat[0, col_idx['ev_total_pct_change_1']] = pct_change_1
+        feat[0, col_idx['ev_total_pct_change_3']] = pct_change_3
+        feat[0, col_idx['ev_growth_slope']] = ev_growth_slope
+
+        pred = model.predict(feat_df)[0]
+        future_rows.append({"Date": forecast_date, "Predicted EV Total": pred})
+        historical_ev[:-1] = historical_ev[1:]
+        historical_ev[-1] = pred
+        cumulative_ev[:-1] = cumulative_ev[1:]
+        cumulative_ev[-1] = cumulative_ev[-2] + pred
+        filled = min(filled + 1, 6)
+
+    # Combine historical + forecast
+    historical_cum = pd.DataFrame({
+        'Date': county_df['Date'].values,
+        'Cumulative EV': np.cumsum(county_df['Electric Vehicle (EV) Total'].values),
+        'Source': 'Historical'
+    })
+
+    forecast_df = pd.DataFrame(future_rows)
+    forecast_df['Predicted EV Total'] = forecast_df['Predicted EV Total'].round().astype(int)
+    forecast_df['Source'] = 'Forecast'
+    forecast_df['Cumulative EV'] = forecast_df['Predicted EV Total'].cumsum() + historical_cum['Cumulative EV'].iloc[-1]
+
+    return pd.concat([
+        historical_cum,
+        forecast_df[['Date', 'Cumulative EV', 'Source']]
+    ], ignore_index=True)
+
+@st.cache_data(show_spinner=False)
+def comparison_frame(counties):
+    # Runs once per new selection since this function is cached. 1-row
+    # predicts are mostly Python-side work under the GIL, so the overlap
+    # is limited to the tree traversal itself
+    ctx = get_script_run_ctx()
+
+    def run(cty):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return forecast_county(cty)
+
+    results = Parallel(n_jobs=min(3, len(counties)), backend="threading")(
+        delayed(run)(cty) for cty in counties
+    )
+
+    return pd.DataFrame({
+        'Date': np.concatenate([combined['Date'].values for combined in results]),
+        'Cumulative EV': np.concatenate([combined['Cumulative EV'].values for combined in results]),
+        'County': np.repeat(counties, [len(combined) for combined in results])
+    })
+
+def render_figure(fig):
+    # Same PNG settings st.pyplot uses; close so pyplot drops the figure
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False)
+def county_chart(county):
+    combined = forecast_county(county)
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for label, data in combined.groupby('Source'):
+        ax.plot(data['Date'], data['Cumulative EV'], label=label, marker='o')
+    ax.set_title(f"Cumulative EV Trend - {county} (3 Years Forecast)", fontsize=14, color='white')
+    ax.set_xlabel("Date", color='white')
+    ax.set_ylabel("Cumulative EV Count", color='white')
+    ax.grid(True, alpha=0.3)
+    ax.set_facecolor("#1c1c1c")
+    fig.patch.set_facecolor('#1c1c1c')
+    ax.tick_params(colors='white')
+    ax.legend()
+    return render_figure(fig)
+
+@st.cache_data(show_spinner=False)
+def comparison_chart(counties):
+    comp_df = comparison_frame(counties)
+    fig, ax = plt.subplots(figsize=(14, 7))
+    for cty, group in comp_df.groupby('County'):
+        ax.plot(group['Date'], group['Cumulative EV'], marker='o', label=cty)
+    ax.set_title("EV Trends: Historical + Forecast", fontsize=16, color='white')
+    ax.set_xlabel("Date", color='white')
+    ax.set_ylabel("Cumulative EV Count", color='white')
+    ax.grid(True, alpha=0.3)
+    ax.set_facecolor("#1c1c1c")
+    fig.patch.set_facecolor('#1c1c1c')
+    ax.tick_params(colors='white')
+    ax.legend(title="County")
+    return render_figure(fig)
 
 # County selection
-county_list = sorted(df['County'].dropna().unique().tolist())
+county_list = get_county_list()
 county = st.selectbox("Select a County", county_list)
 
-if county not in df['County'].unique():
-    st.warning(f"County '{county}' not found in dataset.")
+if len(county_frames()[county]) < min_history:
+    st.warning(f"Not enough history to forecast {county} County.")
     st.stop()
 
-county_df = df[df['County'] == county].sort_values("Date")
-county_code = county_df['county_encoded'].iloc[0]
-
-# Forecasting
-historical_ev = list(county_df['Electric Vehicle (EV) Total'].values[-6:])
-cumulative_ev = list(np.cumsum(historical_ev))
-months_since_start = county_df['months_since_start'].max()
-latest_date = county_df['Date'].max()
-forecast_horizon = 36
-future_rows = []
-
-for i in range(1, forecast_horizon + 1):
-    forecast_date = latest_date + pd.DateOffset(months=i)
-    months_since_start += 1
-    lag1, lag2, lag3 = historical_ev[-1], historical_ev[-2], historical_ev[-3]
-    roll_mean = np.mean([lag1, lag2, lag3])
-    pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-    pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-    ev_growth_slope = np.polyfit(range(6), cumulative_ev[-6:], 1)[0] if len(cumulative_ev) >= 6 else 0
-
-    row = {
-        'months_since_start': months_since_start,
-        'county_encoded': county_code,
-        'ev_total_lag1': lag1,
-        'ev_total_lag2': lag2,
-        'ev_total_lag3': lag3,
-        'ev_total_roll_mean_3': roll_mean,
-        'ev_total_pct_change_1': pct_change_1,
-        'ev_total_pct_change_3': pct_change_3,
-        'ev_growth_slope': ev_growth_slope
-    }
-
-    pred = model.predict(pd.DataFrame([row]))[0]
-    future_rows.append({"Date": forecast_date, "Predicted EV Total": round(pred)})
-    historical_ev.append(pred)
-    historical_ev = historical_ev[-6:]
-    cumulative_ev.append(cumulative_ev[-1] + pred)
-    cumulative_ev = cumulative_ev[-6:]
-
-# Combine for plotting
-historical_cum = county_df[['Date', 'Electric Vehicle (EV) Total']].copy()
-historical_cum['Source'] = 'Historical'
-historical_cum['Cumulative EV'] = historical_cum['Electric Vehicle (EV) Total'].cumsum()
-
-forecast_df = pd.DataFrame(future_rows)
-forecast_df['Source'] = 'Forecast'
-forecast_df['Cumulative EV'] = forecast_df['Predicted EV Total'].cumsum() + historical_cum['Cumulative EV'].iloc[-1]
-
-combined = pd.concat([
-    historical_cum[['Date', 'Cumulative EV', 'Source']],
-    forecast_df[['Date', 'Cumulative EV', 'Source']]
-], ignore_index=True)
+combined = forecast_county(county)
 
 # Plot
 st.subheader(f"📊 Cumulative EV Forecast for {county} County")
-fig, ax = plt.subplots(figsize=(12, 6))
-for label, data in combined.groupby('Source'):
-    ax.plot(data['Date'], data['Cumulative EV'], label=label, marker='o')
-ax.set_title(f"Cumulative EV Trend - {county} (3 Years Forecast)", fontsize=14, color='white')
-ax.set_xlabel("Date", color='white')
-ax.set_ylabel("Cumulative EV Count", color='white')
-ax.grid(True, alpha=0.3)
-ax.set_facecolor("#1c1c1c")
-fig.patch.set_facecolor('#1c1c1c')
-ax.tick_params(colors='white')
-ax.legend()
-st.pyplot(fig)
+st.image(county_chart(county), use_container_width=True)
 
 # Forecast summary
-hist_total = historical_cum['Cumulative EV'].iloc[-1]
-forecast_total = forecast_df['Cumulative EV'].iloc[-1]
+hist_total = combined.loc[combined['Source'] == 'Historical', 'Cumulative EV'].iloc[-1]
+forecast_total = combined['Cumulative EV'].iloc[-1]
 if hist_total > 0:
     growth_pct = ((forecast_total - hist_total) / hist_total) * 100
     trend = "increase 📈" if growth_pct > 0 else "decrease 📉"
@@ -142,77 +243,24 @@ else:
 st.markdown("---")
 st.header("Compare EV Adoption Trends for up to 3 Counties")
 
-multi_counties = st.multiselect("Select up to 3 counties", county_list)
+# Inside a form the selection is only committed on submit, so picking
+# counties one by one doesn't rerun the comparison for each partial list
+with st.form("compare_form"):
+    multi_counties = st.multiselect("Select up to 3 counties", county_list)
+    st.form_submit_button("Compare")
+
+short_counties = [cty for cty in multi_counties if len(county_frames()[cty]) < min_history]
 
 if len(multi_counties) > 3:
     st.error("Please select only up to 3 counties.")
+elif short_counties:
+    st.warning("Not enough history to forecast: " + ", ".join(short_counties))
 else:
-    comparison_data = []
-
-    for cty in multi_counties:
-        cty_df = df[df['County'] == cty].sort_values("Date")
-        cty_code = cty_df['county_encoded'].iloc[0]
-        hist_ev = list(cty_df['Electric Vehicle (EV) Total'].values[-6:])
-        cum_ev = list(np.cumsum(hist_ev))
-        months_since = cty_df['months_since_start'].max()
-        last_date = cty_df['Date'].max()
-
-        future_rows_cty = []
-        for i in range(1, forecast_horizon + 1):
-            forecast_date = last_date + pd.DateOffset(months=i)
-            months_since += 1
-            lag1, lag2, lag3 = hist_ev[-1], hist_ev[-2], hist_ev[-3]
-            roll_mean = np.mean([lag1, lag2, lag3])
-            pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-            pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-            ev_slope = np.polyfit(range(6), cum_ev[-6:], 1)[0] if len(cum_ev) >= 6 else 0
-
-            row = {
-                'months_since_start': months_since,
-                'county_encoded': cty_code,
-                'ev_total_lag1': lag1,
-                'ev_total_lag2': lag2,
-                'ev_total_lag3': lag3,
-                'ev_total_roll_mean_3': roll_mean,
-                'ev_total_pct_change_1': pct_change_1,
-                'ev_total_pct_change_3': pct_change_3,
-                'ev_growth_slope': ev_slope
-            }
-
-            pred = model.predict(pd.DataFrame([row]))[0]
-            future_rows_cty.append({"Date": forecast_date, "Predicted EV Total": round(pred)})
-            hist_ev.append(pred)
-            hist_ev = hist_ev[-6:]
-            cum_ev.append(cum_ev[-1] + pred)
-            cum_ev = cum_ev[-6:]
-
-        hist_cum = cty_df[['Date', 'Electric Vehicle (EV) Total']].copy()
-        hist_cum['Cumulative EV'] = hist_cum['Electric Vehicle (EV) Total'].cumsum()
-        fc_df = pd.DataFrame(future_rows_cty)
-        fc_df['Cumulative EV'] = fc_df['Predicted EV Total'].cumsum() + hist_cum['Cumulative EV'].iloc[-1]
-
-        combined_cty = pd.concat([
-            hist_cum[['Date', 'Cumulative EV']],
-            fc_df[['Date', 'Cumulative EV']]
-        ], ignore_index=True)
-        combined_cty['County'] = cty
-        comparison_data.append(combined_cty)
-
-    if comparison_data:
-        comp_df = pd.concat(comparison_data, ignore_index=True)
+    if multi_counties:
+        counties = tuple(multi_counties)
+        comp_df = comparison_frame(counties)
         st.subheader("📈 Comparison of Cumulative EV Trends")
-        fig, ax = plt.subplots(figsize=(14, 7))
-        for cty, group in comp_df.groupby('County'):
-            ax.plot(group['Date'], group['Cumulative EV'], marker='o', label=cty)
-        ax.set_title("EV Trends: Historical + Forecast", fontsize=16, color='white')
-        ax.set_xlabel("Date", color='white')
-        ax.set_ylabel("Cumulative EV Count", color='white')
-        ax.grid(True, alpha=0.3)
-        ax.set_facecolor("#1c1c1c")
-        fig.patch.set_facecolor('#1c1c1c')
-        ax.tick_params(colors='white')
-        ax.legend(title="County")
-        st.pyplot(fig)
+        st.image(comparison_chart(counties), use_container_width=True)
 
         # Growth summary
         growth_summary = []
@@ -230,5 +278,4 @@ else:
 
 st.success("Forecast complete")
 st.markdown("Prepared for the **AICTE Internship Cycle 2 by Chetna Bharti **")
-st.markdown("Prepared for the **AICTE Internship Cycle 2 by Chetna Bharti **")
 